@@ -3,10 +3,16 @@ from __future__ import annotations
 import json
 from pathlib import Path
 from datetime import datetime
+import numpy as np
 import pandas as pd
 import streamlit as st
 
-from etl.pipeline import ETLPaths, append_raw_row, run_pipeline
+try:
+    import orjson
+except ImportError:  # fallback: json da stdlib
+    orjson = None
+
+from etl.pipeline import ETLPaths, append_raw_rows, run_pipeline
 
 # =========================
 # Paths / Config
@@ -14,31 +20,70 @@ from etl.pipeline import ETLPaths, append_raw_row, run_pipeline
 BASE_DIR = Path(__file__).parent
 QUESTIONS_PATH = BASE_DIR / "config" / "perguntas.json"
 RAW_CSV = BASE_DIR / "data" / "raw" / "respostas_raw.csv"
-CURATED_CSV = BASE_DIR / "data" / "curated" / "respostas_curadas.csv"
+CURATED_PARQUET = BASE_DIR / "data" / "curated" / "respostas_curadas.parquet"
 
-PATHS = ETLPaths(raw_csv=RAW_CSV, curated_csv=CURATED_CSV)
+PATHS = ETLPaths(raw_csv=RAW_CSV, curated_parquet=CURATED_PARQUET)
 
 
 def utc_now_iso() -> str:
     return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
 
+def _fmt_option(kv: tuple[str, str]) -> str:
+    return f"{kv[0]} — {kv[1]}"
+
+
 @st.cache_data
 def load_questions() -> dict:
+    if orjson is not None:
+        return orjson.loads(QUESTIONS_PATH.read_bytes())
     with open(QUESTIONS_PATH, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def load_processed() -> pd.DataFrame:
+@st.cache_resource
+def questions_index() -> dict:
+    # índice plano question_id -> questão (gabarito, pergunta, opcoes, explicacao),
+    # montado uma vez por processo e compartilhado: tratar como somente leitura
+    return {q["id"]: q for block in load_questions().values() for q in block}
+
+
+@st.cache_resource
+def _curated_singleton(path_str: str, mtime: float) -> pd.DataFrame:
+    # mtime entra só na chave do cache: arquivo regravado -> nova leitura.
+    # cache_resource não copia o DataFrame a cada acesso: tratar como somente leitura.
+    # Parquet já traz o schema (acertou chega como uint8, sem conversão)
+    return pd.read_parquet(path_str, engine="pyarrow")
+
+
+@st.cache_data
+def load_results(path_str: str, mtime: float) -> tuple[pd.DataFrame, dict]:
+    # agregações do painel (pequenas): calculadas uma vez por versão do arquivo
+    df = _curated_singleton(path_str, mtime)
+    ranking = (
+        df.groupby("aluno")["acertou"]
+        .sum()
+        .reset_index()
+        .sort_values("acertou", ascending=False)
+    )
+    totais = {
+        "respostas": int(df.shape[0]),
+        "alunos": int(df["aluno"].nunique()),
+        "acertos": int(df["acertou"].sum()),
+    }
+    return ranking, totais
+
+
+def load_processed() -> tuple[pd.DataFrame, pd.DataFrame, dict]:
     """
-    Lê a base tratada (resultado do ETL).
+    Lê a base tratada (resultado do ETL) e as agregações do painel,
+    com cache por data de modificação do arquivo.
     """
-    if CURATED_CSV.exists():
-        df = pd.read_csv(CURATED_CSV, dtype="string", keep_default_na=False)
-        if "acertou" in df.columns:
-            df["acertou"] = pd.to_numeric(df["acertou"], errors="coerce").fillna(0).astype("int64")
-        return df
-    return pd.DataFrame()
+    if CURATED_PARQUET.exists():
+        key = (str(CURATED_PARQUET), CURATED_PARQUET.stat().st_mtime)
+        ranking, totais = load_results(*key)
+        return _curated_singleton(*key), ranking, totais
+    return pd.DataFrame(), pd.DataFrame(), {}
 
 
 # =========================
@@ -81,11 +126,13 @@ st.caption("Fluxo: respostas chegam como **dados brutos** → ETL trata e consol
 
 tabs = st.tabs(["📝 Responder", "⚙️ Rodar ETL", "📊 Resultados"])
 questions_by_block = load_questions()
+q_index = questions_index()
 
 # -------------------------
 # Tab: Responder
 # -------------------------
-with tabs[0]:
+@st.fragment
+def render_responder() -> None:
     col1, col2, col3 = st.columns(3)
     with col1:
         turma = st.text_input("Turma", value="Turma A")
@@ -109,22 +156,22 @@ with tabs[0]:
     mostrar_feedback = st.toggle("Mostrar feedback (correta + explicação) após enviar", value=True)
 
     with st.form("form_quiz"):
-        answers: list[tuple[dict, str | None]] = []
+        answers: list[tuple[str, str | None]] = []
 
         for q in q_list:
             st.markdown(f"**{q['pergunta']}**")
-            op_keys = list(q["opcoes"].keys())
 
             # ✅ Sem marcação automática
             choice = st.radio(
                 label="Escolha uma alternativa:",
-                options=op_keys,
-                format_func=lambda k, _q=q: f"{k} — {_q['opcoes'][k]}",
+                options=list(q["opcoes"].items()),
+                format_func=_fmt_option,
                 index=None,
                 key=q["id"],
             )
+            choice = choice[0] if choice else None
 
-            answers.append((q, choice))
+            answers.append((q["id"], choice))
             st.write("")
 
         submitted = st.form_submit_button("✅ Enviar respostas")
@@ -138,28 +185,45 @@ with tabs[0]:
             st.error("Responda todas as questões (marque uma alternativa em cada uma).")
             st.stop()
 
+        # correção vetorizada: uma comparação para o bloco inteiro
+        choices = np.array([choice for _, choice in answers], dtype=object)
+        gabaritos = np.array([q_index[qid]["gabarito"] for qid, _ in answers], dtype=object)
+        acertou_arr = (choices == gabaritos).astype(np.int8)
+        total_acertos = int(acertou_arr.sum())
+
         feedback = []
-        total_acertos = 0
+        rows_to_append = []
+        now_iso = utc_now_iso()  # mesmo timestamp para todas as linhas do envio
 
-        for q, choice in answers:
-            acertou = 1 if choice == q["gabarito"] else 0
-            total_acertos += acertou
+        for (qid, choice), acertou in zip(answers, acertou_arr.tolist()):
+            q = q_index[qid]
 
             row = {
-                "timestamp": utc_now_iso(),
+                "timestamp": now_iso,
                 "turma": turma.strip(),
                 "aluno": aluno.strip(),
                 "bloco": bloco.strip(),
-                "question_id": q["id"],
+                "question_id": qid,
                 "pergunta": q["pergunta"],
                 "tipo": q.get("tipo", "multipla"),
                 "resposta_aluno": choice,
                 "gabarito": q["gabarito"],
                 "acertou": acertou,
             }
-            append_raw_row(PATHS, row)
-
-            feedback.append((q, choice, acertou))
+            rows_to_append.append(row)
+
+            feedback.append((qid, choice, acertou))
+
+        # um envio = um lote: gravação única (flush) ao final do handler
+        try:
+            append_raw_rows(PATHS, rows_to_append)
+        except ValueError as e:
+            # ex.: base RAW com cabeçalho diferente de REQUIRED_COLUMNS
+            st.error(
+                "Não foi possível registrar as respostas na **Base Bruta (RAW)**. "
+                f"Avise o professor. Detalhe: {e}"
+            )
+            st.stop()
 
         st.success("Respostas registradas na **Base Bruta (RAW)**.")
         st.info("Para atualizar o painel geral (gráficos e ranking), vá na aba **Rodar ETL**.")
@@ -169,7 +233,10 @@ with tabs[0]:
             st.subheader("Feedback das respostas")
             st.write(f"**Resumo do bloco:** {total_acertos} acerto(s) de {len(feedback)} questão(ões).")
 
-            for q, choice, acertou in feedback:
+            # um único markdown para todo o feedback (um elemento em vez de vários)
+            parts: list[str] = []
+            for qid, choice, acertou in feedback:
+                q = q_index[qid]
                 correta = q["gabarito"]
                 texto_correta = q["opcoes"][correta]
                 explicacao = q.get("explicacao", "").strip()
@@ -177,21 +244,26 @@ with tabs[0]:
                 texto_marcada = q["opcoes"].get(choice, "")
 
                 if acertou == 1:
-                    st.success(
+                    parts.append(
                         f"✅ **{q['pergunta']}**\n\n"
                         f"Você marcou: **{choice} — {texto_marcada}**\n\n"
                         f"Correto."
                     )
                 else:
-                    st.error(
+                    if not explicacao:
+                        explicacao = "(adicione o campo `explicacao` no perguntas.json)"
+                    parts.append(
                         f"❌ **{q['pergunta']}**\n\n"
                         f"Você marcou: **{choice} — {texto_marcada}**\n\n"
-                        f"✅ Correta: **{correta} — {texto_correta}**"
+                        f"✅ Correta: **{correta} — {texto_correta}**\n\n"
+                        f"🧠 **Por que é a correta?** {explicacao}"
                     )
-                    if explicacao:
-                        st.info(f"🧠 **Por que é a correta?** {explicacao}")
-                    else:
-                        st.info("🧠 **Por que é a correta?** (adicione o campo `explicacao` no perguntas.json)")
+
+            st.markdown("\n\n---\n\n".join(parts), unsafe_allow_html=False)
+
+
+with tabs[0]:
+    render_responder()
 
 # -------------------------
 # Tab: Rodar ETL
@@ -208,53 +280,46 @@ with tabs[1]:
 
     if st.button("▶️ Rodar ETL agora"):
         df_processed, metrics = run_pipeline(PATHS)
+        _curated_singleton.clear()
+        load_results.clear()
         st.success("ETL executado. Painel atualizado com a **Base Tratada**.")
         st.json(metrics)
 
 # -------------------------
 # Tab: Resultados
 # -------------------------
-with tabs[2]:
+@st.fragment
+def render_results() -> None:
     st.subheader("Resultados (Base Tratada)")
 
-    df = load_processed()
+    df, ranking, totais = load_processed()
 
     if df.empty:
         st.warning("Ainda não existe **Base Tratada**. Rode o ETL na aba **Rodar ETL**.")
     else:
-        df["acertou"] = pd.to_numeric(df["acertou"], errors="coerce").fillna(0).astype("int64")
-
         c1, c2, c3, c4 = st.columns(4)
-        c1.metric("Respostas (consolidadas)", int(df.shape[0]))
-        c2.metric("Alunos", int(df["aluno"].nunique()))
-        c3.metric("Acertos", int(df["acertou"].sum()))
-        total = int(df.shape[0]) if df.shape[0] > 0 else 1
-        c4.metric("% Acerto", f"{(df['acertou'].sum() / total) * 100:.1f}%")
+        c1.metric("Respostas (consolidadas)", totais["respostas"])
+        c2.metric("Alunos", totais["alunos"])
+        c3.metric("Acertos", totais["acertos"])
+        total = totais["respostas"] if totais["respostas"] > 0 else 1
+        c4.metric("% Acerto", f"{(totais['acertos'] / total) * 100:.1f}%")
 
         st.divider()
 
         # ✅ GRÁFICO COM EIXO X = ALUNO
         st.markdown("### Acertos por aluno (Eixo X = Aluno)")
-        by_aluno = (
-            df.groupby("aluno")["acertou"]
-            .sum()
-            .reset_index()
-            .sort_values("acertou", ascending=False)
-        )
-        st.bar_chart(by_aluno.set_index("aluno")["acertou"])
+        st.bar_chart(ranking.set_index("aluno")["acertou"])
 
         st.divider()
 
         st.markdown("### Ranking de alunos (acertos)")
-        ranking = (
-            df.groupby("aluno")["acertou"]
-            .sum()
-            .reset_index()
-            .sort_values("acertou", ascending=False)
-        )
         st.dataframe(ranking, use_container_width=True)
 
         st.divider()
 
         st.markdown("### Base Tratada (dados finais para análise)")
         st.dataframe(df, use_container_width=True)
+
+
+with tabs[2]:
+    render_results()
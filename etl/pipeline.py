@@ -1,14 +1,19 @@
 from __future__ import annotations
 
+import csv
 from dataclasses import dataclass
 from pathlib import Path
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 
 
 @dataclass
 class ETLPaths:
     raw_csv: Path
-    curated_csv: Path
+    curated_parquet: Path
 
 
 REQUIRED_COLUMNS = [
@@ -24,6 +29,16 @@ REQUIRED_COLUMNS = [
     "acertou"
 ]
 
+# schema explícito na leitura (evita inferência de tipos do read_csv).
+# acertou é lido como texto de propósito: um valor inválido numa linha do RAW
+# ("1.0", "True", "-1"...) não pode derrubar a leitura inteira; a conversão é no transform
+READ_DTYPES = {c: pa.string() for c in REQUIRED_COLUMNS}
+
+# bases RAW cujo cabeçalho já foi validado neste processo
+_raw_header_checked: set[Path] = set()
+
+TEXT_COLUMNS = ["turma", "aluno", "bloco", "question_id", "pergunta", "tipo", "resposta_aluno", "gabarito"]
+
 
 def ensure_parent_dir(path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -31,34 +46,45 @@ def ensure_parent_dir(path: Path) -> None:
 
 def extract(raw_csv: Path) -> pd.DataFrame:
     if not raw_csv.exists():
-        return pd.DataFrame(columns=REQUIRED_COLUMNS)
+        return pa.schema(list(READ_DTYPES.items())).empty_table().to_pandas(types_mapper=pd.ArrowDtype)
 
-    df = pd.read_csv(raw_csv, dtype="string", keep_default_na=False)
+    table = pacsv.read_csv(
+        raw_csv,
+        convert_options=pacsv.ConvertOptions(column_types=READ_DTYPES, strings_can_be_null=False),
+    )
 
-    for col in REQUIRED_COLUMNS:
-        if col not in df.columns:
-            df[col] = ""
+    # colunas ausentes entram nulas, já com o tipo do schema
+    for col, col_type in READ_DTYPES.items():
+        if col not in table.column_names:
+            table = table.append_column(col, pa.nulls(table.num_rows, col_type))
 
-    return df[REQUIRED_COLUMNS]
+    return table.select(REQUIRED_COLUMNS).to_pandas(types_mapper=pd.ArrowDtype)
 
 
 def transform(df_raw: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
-    df = df_raw.copy()
+    # df_raw vem direto do extract (sem outros usos): trabalha sem cópia
+    df = df_raw
 
-    # limpeza básica
-    for col in ["turma", "aluno", "bloco", "question_id", "pergunta", "tipo", "resposta_aluno", "gabarito"]:
-        df[col] = df[col].astype("string").fillna("").str.strip()
+    # limpeza básica (Arrow compute: vazio no lugar de nulo + trim)
+    for col in TEXT_COLUMNS:
+        cleaned = pc.utf8_trim_whitespace(pc.fill_null(pa.array(df[col]), ""))
+        df[col] = pd.array(cleaned, dtype=pd.ArrowDtype(pa.string()))
 
-    # acertou -> int
-    df["acertou"] = pd.to_numeric(df["acertou"], errors="coerce").fillna(0).astype("int64")
+    # colunas de baixa cardinalidade -> category (o Parquet preserva o tipo)
+    for col in ["turma", "bloco", "question_id", "gabarito", "tipo"]:
+        df[col] = df[col].astype("category")
+
+    # acertou -> uint8 (só 0/1): inválido/vazio vira 0, como no baseline
+    df["acertou"] = pd.to_numeric(df["acertou"], errors="coerce").fillna(0).clip(0, 1).astype("uint8")
 
     # remove linhas sem aluno
-    df = df[df["aluno"] != ""].copy()
+    df = df[df["aluno"] != ""]
 
     # dedup: última resposta do aluno naquela questão
-    before = df.shape[0]
-    df = df.drop_duplicates(subset=["aluno", "question_id"], keep="last")
-    after = df.shape[0]
+    # (RAW é append-only em ordem de timestamp: tail(1) = última resposta)
+    before = len(df)
+    df = df.groupby(["aluno", "question_id"], sort=False, observed=True).tail(1)
+    after = len(df)
 
     metrics = {
         "linhas_raw": int(before),
@@ -67,29 +93,50 @@ def transform(df_raw: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
         "total_acertos": int(df["acertou"].sum())
     }
 
-    # ordenação
+    # ordenação (já sobre a base deduplicada)
     df = df.sort_values(by=["turma", "aluno", "bloco", "question_id"])
 
     return df, metrics
 
 
-def load(df_curated: pd.DataFrame, curated_csv: Path) -> None:
-    ensure_parent_dir(curated_csv)
-    df_curated.to_csv(curated_csv, index=False)
+def load(df_curated: pd.DataFrame, curated_parquet: Path) -> None:
+    ensure_parent_dir(curated_parquet)
+    table = pa.Table.from_pandas(df_curated, preserve_index=False)
+    pq.write_table(table, str(curated_parquet), compression="snappy")
 
 
 def run_pipeline(paths: ETLPaths) -> tuple[pd.DataFrame, dict]:
     df_raw = extract(paths.raw_csv)
     df_curated, metrics = transform(df_raw)
-    load(df_curated, paths.curated_csv)
+    load(df_curated, paths.curated_parquet)
     return df_curated, metrics
 
 
-def append_raw_row(paths: ETLPaths, row: dict) -> None:
+def _ensure_raw_header(paths: ETLPaths) -> None:
+    # valida o cabeçalho uma única vez, em vez de reler a base a cada append
+    if paths.raw_csv in _raw_header_checked:
+        return
+
+    if paths.raw_csv.exists() and paths.raw_csv.stat().st_size > 0:
+        with open(paths.raw_csv, "r", newline="", encoding="utf-8") as f:
+            header = next(csv.reader(f), [])
+        if header != REQUIRED_COLUMNS:
+            raise ValueError(f"Cabeçalho inesperado em {paths.raw_csv}: {header}")
+
+    _raw_header_checked.add(paths.raw_csv)
+
+
+def append_raw_rows(paths: ETLPaths, rows: list[dict]) -> None:
     ensure_parent_dir(paths.raw_csv)
+    _ensure_raw_header(paths)
 
-    df_existing = extract(paths.raw_csv)
-    df_new = pd.DataFrame([row], columns=REQUIRED_COLUMNS)
+    # append das linhas (sem reler/reescrever a base RAW inteira)
+    with open(paths.raw_csv, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=REQUIRED_COLUMNS)
+        if f.tell() == 0:
+            writer.writeheader()
+        writer.writerows(rows)
 
-    df_out = pd.concat([df_existing, df_new], ignore_index=True)
-    df_out.to_csv(paths.raw_csv, index=False)
+
+def append_raw_row(paths: ETLPaths, row: dict) -> None:
+    append_raw_rows(paths, [row])